@@ -1,6 +1,5 @@
-from sqlalchemy import create_engine, Float, String, Integer, Column, DateTime
+from sqlalchemy import create_engine, Computed, Index, Numeric, String, Integer, Column, DateTime, func
 from sqlalchemy.orm import declarative_base, sessionmaker
-from datetime import datetime
 import os
 
 # Get DATABASE_URL from environment variable (Railway sets this automatically)
@@ -14,7 +13,25 @@ DATABASE_URL = os.getenv(
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-engine = create_engine(DATABASE_URL)
+# Connection pool sizing; tune DB_POOL_SIZE to expected concurrent requests
+# times database calls per request
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "40"))
+
+# Multi-row INSERTs are already batched into multi-VALUES statements by
+# SQLAlchemy's insertmanyvalues; values_plus_batch additionally sends
+# executemany UPDATEs, such as the bulk update(Trade) in analyze_portfolio,
+# through psycopg2's execute_batch instead of one round-trip per row
+engine = create_engine(
+    DATABASE_URL,
+    executemany_mode="values_plus_batch",
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    # Check connections on checkout and recycle them before Postgres
+    # idle timeouts can close them
+    pool_pre_ping=True,
+    pool_recycle=1800
+)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
 Base = declarative_base()
@@ -23,15 +40,41 @@ Base = declarative_base()
 class Trade(Base):
     __tablename__ = "trades"
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(String, index=True, nullable=False)
+    user_id = Column(String, nullable=False)
     coin_symbol = Column(String, index=True, nullable=False)
-    quantity = Column(Float, nullable=False)
-    avg_buy_price = Column(Float, nullable=False)
-    current_price = Column(Float, nullable=False)
-    unrealized_pnl = Column(Float, nullable=False)
-    percent_change = Column(Float, nullable=False)
+    quantity = Column(Numeric(38, 18), nullable=False)
+    avg_buy_price = Column(Numeric(38, 18), nullable=False)
+    current_price = Column(Numeric(38, 18), nullable=False)
+
+    # Derived from the price columns and maintained by Postgres on every write
+    unrealized_pnl = Column(Numeric, Computed(
+        "quantity * (current_price - avg_buy_price)", persisted=True))
+    percent_change = Column(Numeric, Computed(
+        "CASE WHEN avg_buy_price > 0 "
+        "THEN (current_price - avg_buy_price) / avg_buy_price * 100 "
+        "ELSE 0 END", persisted=True))
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # Includes every column the portfolio read loads (see PORTFOLIO_COLUMNS
+    # in main.py), so Postgres can answer it with an index-only scan on pages
+    # the visibility map marks all-visible; also serves plain user_id
+    # lookups, so user_id has no index of its own
+    __table_args__ = (
+        Index(
+            "ix_trades_user_coin",
+            "user_id",
+            "coin_symbol",
+            postgresql_include=[
+                "id",
+                "quantity",
+                "avg_buy_price",
+                "current_price",
+                "unrealized_pnl",
+                "percent_change"
+            ]
+        ),
+    )
 
 
 def create_tables():
@@ -1,12 +1,18 @@
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 from database import Trade, create_tables, get_db
 from fastapi import Depends, FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
-from pycoingecko import CoinGeckoAPI
-from typing import Dict, Optional
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session, load_only
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
 import asyncio
+import httpx
+import json
+import os
+import tempfile
+import time
 
 
 class TradeCreate(BaseModel):
@@ -38,184 +44,380 @@ class TradeResponse(BaseModel):
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Create database tables at startup
-    create_tables()
-    print("Database tables created.")
+    # Create database tables at startup only when asked to; otherwise the
+    # schema is managed out-of-band by migrations
+    if os.getenv("CREATE_SCHEMA", "").strip().lower() in ("1", "true", "yes"):
+        create_tables()
+        print("Database tables created.")
+
+    # Share one pooled HTTP/2 client across all CoinGecko calls so
+    # connections are kept alive and concurrent requests are multiplexed
+    app.state.http = httpx.AsyncClient(
+        base_url=COINGECKO_API_URL,
+        http2=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        timeout=30.0
+    )
+
+    # Serve full-list symbol lookups from the local snapshot and keep it
+    # fresh in the background; refresh right away if it is missing or stale
+    snapshot_age = _load_coin_symbols()
+    if snapshot_age is None:
+        refresh_delay = 0.0
+    else:
+        refresh_delay = max(0.0, COIN_SYMBOLS_REFRESH_INTERVAL - snapshot_age)
+    refresh_task = asyncio.create_task(
+        _refresh_coin_symbols_periodically(refresh_delay))
     yield
     print("Shutting down...")
-    # No specific shutdown actions needed
+    refresh_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await refresh_task
+    await app.state.http.aclose()
 
-# Initialize CoinGecko client
-cg = CoinGeckoAPI()
+COINGECKO_API_URL = "https://api.coingecko.com/api/v3"
 
 # Cache for coin IDs to avoid repeated API calls
 coin_id_cache: Dict[str, str] = {}
 
+# Cache for current prices: coin ID -> (price, expiry on the monotonic clock)
+PRICE_CACHE_TTL = 30
+price_cache: Dict[str, Tuple[Decimal, float]] = {}
+
+# Limit concurrent CoinGecko requests to stay under rate limits, and retry a
+# rate-limited (HTTP 429) request once after a short, capped wait so callers
+# holding a listing lock are not stalled by a long Retry-After
+coingecko_semaphore = asyncio.Semaphore(5)
+COINGECKO_MAX_RETRIES = 1
+COINGECKO_MAX_RETRY_DELAY = 5.0
+
+# Symbol index of the top coins by market cap, which changes rarely:
+# (lowercase symbol -> coin ID, expiry on the monotonic clock)
+COIN_LIST_CACHE_TTL = 3600
+# How long to wait before retrying a failed markets or coins list fetch
+COIN_LIST_RETRY_AFTER = 60
+_markets_cache: Tuple[Dict[str, str], float] = ({}, 0.0)
+
+# Symbol index of CoinGecko's full coins list (lowercase symbol -> coin ID),
+# snapshotted to disk and refreshed daily in the background
+COIN_SYMBOLS_PATH = os.getenv("COIN_SYMBOLS_PATH", "coin_symbols.json")
+COIN_SYMBOLS_REFRESH_INTERVAL = 24 * 3600
+coin_symbols: Dict[str, str] = {}
+# Monotonic time before which a failed on-demand download is not retried
+_coins_list_retry_at = 0.0
+# Held while refreshing a listing so concurrent lookups share one download.
+# Created at import time, which requires Python 3.10+ (earlier versions bind
+# asyncio primitives to the loop that exists when they are created)
+_markets_lock = asyncio.Lock()
+_coins_list_lock = asyncio.Lock()
+
+# Columns the portfolio analysis reads (the primary key is always loaded);
+# all of them are included in the ix_trades_user_coin index
+PORTFOLIO_COLUMNS = (
+    Trade.coin_symbol,
+    Trade.quantity,
+    Trade.avg_buy_price,
+    Trade.current_price,
+    Trade.unrealized_pnl,
+    Trade.percent_change
+)
+
+# Priority matching for major coins: lowercase symbol -> CoinGecko ID
+MAJOR_COINS: Dict[str, str] = {
+    'btc': 'bitcoin',
+    'eth': 'ethereum',
+    'usdt': 'tether',
+    'usdc': 'usd-coin',
+    'bnb': 'binancecoin',
+    'xrp': 'ripple',
+    'sol': 'solana',
+    'ada': 'cardano',
+    'doge': 'dogecoin',
+    'trx': 'tron',
+    'dot': 'polkadot',
+    'matic': 'matic-network',
+    'dai': 'dai',
+    'ltc': 'litecoin',
+    'shib': 'shiba-inu',
+    'avax': 'avalanche-2',
+    'uni': 'uniswap',
+    'link': 'chainlink',
+    'atom': 'cosmos',
+    'xlm': 'stellar',
+    'near': 'near',
+    'algo': 'algorand',
+    'icp': 'internet-computer',
+    'vet': 'vechain',
+    'fil': 'filecoin',
+    'aave': 'aave',
+    'sand': 'the-sandbox',
+    'mana': 'decentraland',
+    'grt': 'the-graph',
+    'axs': 'axie-infinity',
+    'neo': 'neo',
+    'mkr': 'maker',
+    'egld': 'elrond-erd-2',
+    'theta': 'theta-token',
+    'ftm': 'fantom',
+    'xtz': 'tezos',
+    'flow': 'flow',
+    'kcs': 'kucoin-shares',
+    'hbar': 'hedera-hashgraph',
+    'eos': 'eos',
+    'cake': 'pancakeswap-token',
+    'xmr': 'monero',
+    'rune': 'thorchain',
+    'waves': 'waves',
+    'qdx': 'quidax',
+    'comp': 'compound-governance-token',
+    'zec': 'zcash',
+    'enj': 'enjincoin',
+    'dash': 'dash',
+    'celo': 'celo',
+    # Adding more major tokens
+    'apt': 'aptos',
+    'arb': 'arbitrum',
+    'op': 'optimism',
+    'sui': 'sui',
+    'inj': 'injective-protocol',
+    'blur': 'blur',
+    'pepe': 'pepe',
+    'sei': 'sei-network',
+    'stx': 'blockstack',
+    'cfx': 'conflux-token',
+    'kava': 'kava',
+    'gala': 'gala',
+    'rndr': 'render-token',
+    'ldo': 'lido-dao',
+    'imx': 'immutable-x',
+    '1inch': '1inch',
+    'ant': 'aragon',
+    'api3': 'api3',
+    'ar': 'arweave',
+    'audio': 'audius',
+    'bal': 'balancer',
+    'band': 'band-protocol',
+    'bat': 'basic-attention-token',
+    'btt': 'bittorrent',
+    'cel': 'celsius-degree-token',
+    'chz': 'chiliz',
+    'crv': 'curve-dao-token',
+    'cvc': 'civic',
+    'dag': 'constellation-labs',
+    'dent': 'dent',
+    'dydx': 'dydx',
+    'eng': 'engine',
+    'fet': 'fetch-ai',
+    'ftt': 'ftx-token',
+    'glm': 'golem',
+    'gmx': 'gmx',
+    'gtc': 'gitcoin',
+    'hnt': 'helium',
+    'hot': 'holotoken',
+    'ilv': 'illuvium',
+    'jasmy': 'jasmycoin',
+    'knc': 'kyber-network-crystal',
+    'lrc': 'loopring',
+    'mask': 'mask-network',
+    'mina': 'mina-protocol',
+    'ocean': 'ocean-protocol',
+    'omg': 'omisego',
+    'perp': 'perpetual-protocol',
+    'qnt': 'quant-network',
+    'ren': 'republic-protocol',
+    'rlc': 'iexec-rlc',
+    'rose': 'oasis-network',
+    'rsr': 'reserve-rights-token',
+    'sfp': 'safepal',
+    'skl': 'skale',
+    'snx': 'havven',
+    'storj': 'storj',
+    'sushi': 'sushi',
+    'syn': 'synapse-2',
+    'sys': 'syscoin',
+    'tlm': 'alien-worlds',
+    'torn': 'tornado-cash',
+    'tribe': 'tribe-2',
+    'tusd': 'true-usd',
+    'uma': 'uma',
+    'unfi': 'unifi-protocol-dao',
+    'wtc': 'waltonchain',
+    'xvg': 'verge',
+    'yfi': 'yearn-finance',
+    'ygg': 'yield-guild-games',
+    'zil': 'zilliqa',
+    'zrx': '0x'
+}
+
+
+def _retry_delay(response: httpx.Response, attempt: int) -> float:
+    """Seconds to wait before retrying a rate-limited request"""
+    retry_after = response.headers.get("Retry-After", "")
+    delay = float(retry_after) if retry_after.isdigit() else float(2 ** attempt)
+    return min(delay, COINGECKO_MAX_RETRY_DELAY)
+
+
+async def _coingecko_get(path: str, params: Optional[dict] = None):
+    """Send a GET request to a CoinGecko endpoint and decode the JSON body"""
+    for attempt in range(COINGECKO_MAX_RETRIES + 1):
+        async with coingecko_semaphore:
+            response = await app.state.http.get(path, params=params)
+
+        if response.status_code != 429 or attempt == COINGECKO_MAX_RETRIES:
+            break
+
+        # Wait outside the semaphore so other requests can proceed
+        await asyncio.sleep(_retry_delay(response, attempt))
+
+    response.raise_for_status()
+    return response.json()
+
+
+async def _cached_markets() -> Dict[str, str]:
+    """
+    Get a lowercase symbol -> coin ID index of the top coins by market cap,
+    refreshed at most once per TTL
+    """
+    global _markets_cache
+    async with _markets_lock:
+        symbol_index, expires_at = _markets_cache
+        if time.monotonic() >= expires_at:
+            try:
+                coins_list = await _coingecko_get("/coins/markets", {
+                    'vs_currency': 'usd',
+                    'order': 'market_cap_desc',
+                    'per_page': 250,  # Get top coins by market cap
+                    'sparkline': 'false'
+                })
+            except Exception as e:
+                # Keep serving the previous index (if any) and hold off
+                # retrying, so lookups fall through to the local snapshot
+                print(f"Error fetching coin markets: {str(e)}")
+                _markets_cache = (
+                    symbol_index, time.monotonic() + COIN_LIST_RETRY_AFTER)
+                return symbol_index
+
+            symbol_index = {}
+            for coin in coins_list:
+                # The list is sorted by market cap, so the first match wins
+                symbol_index.setdefault(coin['symbol'].lower(), coin['id'])
+            _markets_cache = (
+                symbol_index, time.monotonic() + COIN_LIST_CACHE_TTL)
+    return symbol_index
+
+
+def _load_coin_symbols() -> Optional[float]:
+    """
+    Load the full coins list symbol index from the local snapshot
+    Returns:
+        The age of the snapshot in seconds, or None if none could be loaded
+    """
+    global coin_symbols
+    try:
+        with open(COIN_SYMBOLS_PATH) as f:
+            coin_symbols = json.load(f)
+        return time.time() - os.path.getmtime(COIN_SYMBOLS_PATH)
+    except (OSError, ValueError) as e:
+        print(f"No coin symbol snapshot loaded: {str(e)}")
+        return None
 
-async def get_coin_id(symbol: str) -> Optional[str]:
-    """Get CoinGecko coin ID from symbol"""
-    if symbol.lower() in coin_id_cache:
-        return coin_id_cache[symbol.lower()]
+
+def _save_coin_symbols(symbol_index: Dict[str, str]):
+    """Atomically write the full coins list symbol index to the local snapshot"""
+    # Use a unique temporary file so several workers can save at once
+    snapshot_dir = os.path.dirname(os.path.abspath(COIN_SYMBOLS_PATH))
+    with tempfile.NamedTemporaryFile(
+            "w", dir=snapshot_dir, suffix=".tmp", delete=False) as f:
+        tmp_path = f.name
+        try:
+            json.dump(symbol_index, f)
+        except Exception:
+            f.close()
+            os.remove(tmp_path)
+            raise
+    os.replace(tmp_path, COIN_SYMBOLS_PATH)
+
+
+async def _refresh_coin_symbols():
+    """Download CoinGecko's full coins list and rebuild the symbol index"""
+    global coin_symbols
+    symbol_index: Dict[str, str] = {}
+    for coin in await _coingecko_get("/coins/list"):
+        # Keep the first match for a symbol, as the linear scan did
+        symbol_index.setdefault(coin['symbol'].lower(), coin['id'])
+    coin_symbols = symbol_index
 
     try:
-        # Get list of coins sorted by market cap
-        coins_list = cg.get_coins_markets(
-            vs_currency='usd',
-            order='market_cap_desc',
-            per_page=250,  # Get top coins by market cap
-            sparkline=False
-        )
+        await asyncio.to_thread(_save_coin_symbols, symbol_index)
+    except OSError as e:
+        print(f"Error saving coin symbol snapshot: {str(e)}")
 
-        # Priority matching for major coins
-        major_coins = {
-            'btc': 'bitcoin',
-            'eth': 'ethereum',
-            'usdt': 'tether',
-            'usdc': 'usd-coin',
-            'bnb': 'binancecoin',
-            'xrp': 'ripple',
-            'sol': 'solana',
-            'ada': 'cardano',
-            'doge': 'dogecoin',
-            'trx': 'tron',
-            'dot': 'polkadot',
-            'matic': 'matic-network',
-            'dai': 'dai',
-            'ltc': 'litecoin',
-            'shib': 'shiba-inu',
-            'avax': 'avalanche-2',
-            'uni': 'uniswap',
-            'link': 'chainlink',
-            'atom': 'cosmos',
-            'xlm': 'stellar',
-            'near': 'near',
-            'algo': 'algorand',
-            'icp': 'internet-computer',
-            'vet': 'vechain',
-            'fil': 'filecoin',
-            'aave': 'aave',
-            'sand': 'the-sandbox',
-            'mana': 'decentraland',
-            'grt': 'the-graph',
-            'axs': 'axie-infinity',
-            'neo': 'neo',
-            'mkr': 'maker',
-            'egld': 'elrond-erd-2',
-            'theta': 'theta-token',
-            'ftm': 'fantom',
-            'xtz': 'tezos',
-            'flow': 'flow',
-            'kcs': 'kucoin-shares',
-            'hbar': 'hedera-hashgraph',
-            'eos': 'eos',
-            'cake': 'pancakeswap-token',
-            'xmr': 'monero',
-            'rune': 'thorchain',
-            'waves': 'waves',
-            'qdx': 'quidax',
-            'comp': 'compound-governance-token',
-            'zec': 'zcash',
-            'enj': 'enjincoin',
-            'dash': 'dash',
-            'celo': 'celo',
-            # Adding more major tokens
-            'apt': 'aptos',
-            'arb': 'arbitrum',
-            'op': 'optimism',
-            'sui': 'sui',
-            'inj': 'injective-protocol',
-            'blur': 'blur',
-            'pepe': 'pepe',
-            'sei': 'sei-network',
-            'stx': 'blockstack',
-            'cfx': 'conflux-token',
-            'kava': 'kava',
-            'gala': 'gala',
-            'rndr': 'render-token',
-            'ldo': 'lido-dao',
-            'imx': 'immutable-x',
-            '1inch': '1inch',
-            'ant': 'aragon',
-            'api3': 'api3',
-            'ar': 'arweave',
-            'audio': 'audius',
-            'bal': 'balancer',
-            'band': 'band-protocol',
-            'bat': 'basic-attention-token',
-            'btt': 'bittorrent',
-            'cel': 'celsius-degree-token',
-            'chz': 'chiliz',
-            'crv': 'curve-dao-token',
-            'cvc': 'civic',
-            'dag': 'constellation-labs',
-            'dent': 'dent',
-            'dydx': 'dydx',
-            'eng': 'engine',
-            'fet': 'fetch-ai',
-            'ftt': 'ftx-token',
-            'glm': 'golem',
-            'gmx': 'gmx',
-            'gtc': 'gitcoin',
-            'hnt': 'helium',
-            'hot': 'holotoken',
-            'ilv': 'illuvium',
-            'jasmy': 'jasmycoin',
-            'knc': 'kyber-network-crystal',
-            'lrc': 'loopring',
-            'mask': 'mask-network',
-            'mina': 'mina-protocol',
-            'ocean': 'ocean-protocol',
-            'omg': 'omisego',
-            'perp': 'perpetual-protocol',
-            'qnt': 'quant-network',
-            'ren': 'republic-protocol',
-            'rlc': 'iexec-rlc',
-            'rose': 'oasis-network',
-            'rsr': 'reserve-rights-token',
-            'sfp': 'safepal',
-            'skl': 'skale',
-            'snx': 'havven',
-            'storj': 'storj',
-            'sushi': 'sushi',
-            'syn': 'synapse-2',
-            'sys': 'syscoin',
-            'tlm': 'alien-worlds',
-            'torn': 'tornado-cash',
-            'tribe': 'tribe-2',
-            'tusd': 'true-usd',
-            'uma': 'uma',
-            'unfi': 'unifi-protocol-dao',
-            'wtc': 'waltonchain',
-            'xvg': 'verge',
-            'yfi': 'yearn-finance',
-            'ygg': 'yield-guild-games',
-            'zil': 'zilliqa',
-            'zrx': '0x'
-        }
-
-        # Check if it's a major coin first
-        if symbol.lower() in major_coins:
-            coin_id = major_coins[symbol.lower()]
-            coin_id_cache[symbol.lower()] = coin_id
-            print(f"Debug - Matched major coin: {symbol.upper()} -> {coin_id}")
-            return coin_id
 
+async def _refresh_coin_symbols_periodically(initial_delay: float):
+    """Refresh the full coins list symbol index once a day"""
+    await asyncio.sleep(initial_delay)
+    while True:
+        try:
+            async with _coins_list_lock:
+                await _refresh_coin_symbols()
+        except Exception as e:
+            print(f"Error refreshing coin symbols: {str(e)}")
+        await asyncio.sleep(COIN_SYMBOLS_REFRESH_INTERVAL)
+
+
+async def _cached_coins_list() -> Dict[str, str]:
+    """
+    Get a lowercase symbol -> coin ID index of CoinGecko's full coins list,
+    downloading it on demand only if no snapshot has been loaded yet
+    """
+    global _coins_list_retry_at
+    if coin_symbols:
+        return coin_symbols
+
+    async with _coins_list_lock:
+        # Fail fast while backing off from a failed download rather than
+        # queueing another one behind the lock
+        if not coin_symbols and time.monotonic() < _coins_list_retry_at:
+            raise Exception("CoinGecko coins list is unavailable, retrying later")
+
+        if not coin_symbols:
+            try:
+                await _refresh_coin_symbols()
+            except Exception:
+                _coins_list_retry_at = time.monotonic() + COIN_LIST_RETRY_AFTER
+                raise
+    return coin_symbols
+
+
+async def get_coin_id(symbol: str) -> Optional[str]:
+    """Get CoinGecko coin ID from symbol"""
+    sym_lower = symbol.lower()
+    if sym_lower in coin_id_cache:
+        return coin_id_cache[sym_lower]
+
+    # Check if it's a major coin first, before touching the network
+    coin_id = MAJOR_COINS.get(sym_lower)
+    if coin_id:
+        coin_id_cache[sym_lower] = coin_id
+        print(f"Debug - Matched major coin: {symbol.upper()} -> {coin_id}")
+        return coin_id
+
+    try:
         # If not a major coin, find in the market cap sorted list
-        for coin in coins_list:
-            if coin['symbol'].lower() == symbol.lower():
-                coin_id_cache[symbol.lower()] = coin['id']
-                print(
-                    f"Debug - Matched coin by market cap: {symbol.upper()} -> {coin['id']}")
-                return coin['id']
+        coin_id = (await _cached_markets()).get(sym_lower)
+        if coin_id:
+            coin_id_cache[sym_lower] = coin_id
+            print(
+                f"Debug - Matched coin by market cap: {symbol.upper()} -> {coin_id}")
+            return coin_id
 
         # If still not found, try the full coins list as fallback
-        full_coins_list = cg.get_coins_list()
-        for coin in full_coins_list:
-            if coin['symbol'].lower() == symbol.lower():
-                coin_id_cache[symbol.lower()] = coin['id']
-                print(
-                    f"Debug - Matched coin from full list: {symbol.upper()} -> {coin['id']}")
-                return coin['id']
+        coin_id = (await _cached_coins_list()).get(sym_lower)
+        if coin_id:
+            coin_id_cache[sym_lower] = coin_id
+            print(
+                f"Debug - Matched coin from full list: {symbol.upper()} -> {coin_id}")
+            return coin_id
 
         print(f"Debug - No match found for symbol: {symbol.upper()}")
         return None
@@ -227,33 +429,73 @@ async def get_coin_id(symbol: str) -> Optional[str]:
         )
 
 
-async def get_current_price(coin_id: str, quantity: float = 1.0) -> float:
+async def get_current_price(coin_id: str) -> Decimal:
     """
     Get current price for a coin from CoinGecko
     Parameters:
         coin_id: The CoinGecko ID of the coin
-        quantity: The quantity of the coin (default is 1.0 for single unit price)
     Returns:
-        The current price for the specified quantity
+        The current unit price of the coin
     """
+    cached = price_cache.get(coin_id)
+    if cached and time.monotonic() < cached[1]:
+        return cached[0]
+
     try:
-        # Get detailed market data for accurate pricing
-        coin_data = cg.get_coins_markets(
-            vs_currency='usd',
-            ids=[coin_id],
-            order='market_cap_desc',
-            per_page=1,
-            page=1,
-            sparkline=False
-        )
+        # The simple price endpoint returns only {coin_id: {"usd": price}}
+        price_data = await _coingecko_get(
+            "/simple/price", {'ids': coin_id, 'vs_currencies': 'usd'})
 
-        if not coin_data or len(coin_data) == 0:
+        if price_data.get(coin_id, {}).get('usd') is None:
             raise Exception(f"No price data found for coin {coin_id}")
 
-        unit_price = float(coin_data[0]['current_price'])
-        total_price = unit_price * quantity
+        unit_price = Decimal(str(price_data[coin_id]['usd']))
+        price_cache[coin_id] = (unit_price, time.monotonic() + PRICE_CACHE_TTL)
 
-        return unit_price  # Return unit price, calculations will be done in the trade functions
+        return unit_price
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error fetching price data from CoinGecko: {str(e)}"
+        )
+
+async def get_prices_bulk(coin_ids: List[str]) -> Dict[str, Decimal]:
+    """
+    Get current prices for several coins from CoinGecko in one request
+    Parameters:
+        coin_ids: The CoinGecko IDs of the coins
+    Returns:
+        A mapping of coin ID to current unit price for every coin found
+    """
+    prices: Dict[str, Decimal] = {}
+    missing_ids: List[str] = []
+    now = time.monotonic()
+
+    # Serve fresh prices from the cache and only fetch the rest
+    for coin_id in dict.fromkeys(coin_ids):
+        cached = price_cache.get(coin_id)
+        if cached and now < cached[1]:
+            prices[coin_id] = cached[0]
+        else:
+            missing_ids.append(coin_id)
+
+    try:
+        # Request IDs in chunks of 250 to keep the query string bounded
+        for start in range(0, len(missing_ids), 250):
+            price_data = await _coingecko_get("/simple/price", {
+                'ids': ','.join(missing_ids[start:start + 250]),
+                'vs_currencies': 'usd'
+            })
+            expires_at = time.monotonic() + PRICE_CACHE_TTL
+            for coin_id, quote in price_data.items():
+                if quote.get('usd') is None:
+                    continue
+                unit_price = Decimal(str(quote['usd']))
+                prices[coin_id] = unit_price
+                price_cache[coin_id] = (unit_price, expires_at)
+
+        return prices
 
     except Exception as e:
         raise HTTPException(
@@ -286,28 +528,16 @@ async def create_trade(trade: TradeCreate, user_id: str = Header(alias="User-ID"
                 detail=f"Invalid coin symbol: {trade.coin_symbol}. This symbol was not found on CoinGecko."
             )
 
-        # Get current price from CoinGecko with quantity
-        unit_price = await get_current_price(coin_id, trade.quantity)
-
-        # Calculate initial PnL and percent change with precise decimal arithmetic
-        initial_investment = trade.quantity * trade.avg_buy_price
-        current_value = trade.quantity * unit_price
-        unrealized_pnl = current_value - initial_investment
-
-        # Calculate percent change, handling division by zero
-        if initial_investment > 0:
-            percent_change = (unrealized_pnl / initial_investment) * 100
-        else:
-            percent_change = 0.0
+        # Get current unit price from CoinGecko
+        unit_price = await get_current_price(coin_id)
 
+        # Unrealized PnL and percent change are computed by the database
         new_trade = Trade(
             user_id=user_id,
             coin_symbol=trade.coin_symbol.upper(),
             quantity=trade.quantity,
             avg_buy_price=trade.avg_buy_price,
-            current_price=unit_price,
-            unrealized_pnl=unrealized_pnl,
-            percent_change=percent_change
+            current_price=unit_price
         )
 
         db.add(new_trade)
@@ -333,34 +563,59 @@ async def analyze_portfolio(user_id: str = Header(alias="User-ID"), db: Session
         raise HTTPException(status_code=400, detail="User-ID header missing")
 
     try:
-        trades = db.query(Trade).filter(Trade.user_id == user_id).all()
-
-        if not trades:
-            raise HTTPException(
-                status_code=404, detail="No trades found for this user")
-
+        trades = db.scalars(
+            select(Trade)
+            .options(load_only(*PORTFOLIO_COLUMNS))
+            .where(Trade.user_id == user_id)
+        ).all()
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"An error occurred while fetching trades: {str(e)}"
         )
 
-    total_portfolio_value = 0.0
-    total_profit_loss = 0.0
+    if not trades:
+        raise HTTPException(
+            status_code=404, detail="No trades found for this user")
+
+    total_portfolio_value = Decimal(0)
+    total_profit_loss = Decimal(0)
+    total_investment = Decimal(0)
     trades_analysis = []
+    updates = []
+
+    # Resolve each distinct coin symbol once, concurrently
+    unique_symbols = list(dict.fromkeys(trade.coin_symbol for trade in trades))
+    coin_ids = await asyncio.gather(
+        *[get_coin_id(symbol) for symbol in unique_symbols],
+        return_exceptions=True
+    )
+    sym_to_id = dict(zip(unique_symbols, coin_ids))
+
+    # Fetch current prices for every resolved coin in a single request
+    try:
+        prices = await get_prices_bulk(
+            [coin_id for coin_id in coin_ids if isinstance(coin_id, str)])
+    except HTTPException:
+        prices = {}
 
     for trade in trades:
+        # Every trade counts towards the total investment, priced or not
+        initial_investment = trade.quantity * trade.avg_buy_price
+        total_investment += initial_investment
+
         try:
-            # Get current price from CoinGecko
-            coin_id = await get_coin_id(trade.coin_symbol)
-            if coin_id:
-                current_price = await get_current_price(coin_id)
+            coin_id = sym_to_id[trade.coin_symbol]
+            if isinstance(coin_id, Exception):
+                raise coin_id
 
-                # Update trade's current price in database
-                trade.current_price = current_price
+            if coin_id:
+                if coin_id not in prices:
+                    raise Exception(f"No price data found for coin {coin_id}")
+                current_price = prices[coin_id]
 
-                # Calculate values with precise arithmetic
-                initial_investment = trade.quantity * trade.avg_buy_price
+                # Calculate values with precise decimal arithmetic, matching
+                # the generated columns the database derives from current_price
                 current_value = trade.quantity * current_price
                 unrealized_pnl = current_value - initial_investment
 
@@ -369,24 +624,14 @@ async def analyze_portfolio(user_id: str = Header(alias="User-ID"), db: Session
                     percent_change = (
                         unrealized_pnl / initial_investment) * 100
                 else:
-                    percent_change = 0.0
-
-                print(f"\nDebug - Portfolio Analysis for {trade.coin_symbol}:")
-                print(f"Quantity: {trade.quantity}")
-                print(f"Avg Buy Price: ${trade.avg_buy_price:,.2f}")
-                print(f"Current Price: ${current_price:,.2f}")
-                print(f"Initial Investment: ${initial_investment:,.2f}")
-                print(f"Current Value: ${current_value:,.2f}")
-                print(f"Unrealized PnL: ${unrealized_pnl:,.2f}")
-                print(f"Percent Change: {percent_change:.2f}%")
+                    percent_change = Decimal(0)
 
                 total_portfolio_value += current_value
                 total_profit_loss += unrealized_pnl
 
-                # Update the trade in the database with new values
-                trade.unrealized_pnl = unrealized_pnl
-                trade.percent_change = percent_change
-                db.add(trade)
+                # Queue the new price for a single bulk update; the database
+                # recomputes the derived columns from it
+                updates.append({"id": trade.id, "current_price": current_price})
 
                 trades_analysis.append(
                     TradeAnalysisItem(
@@ -399,13 +644,12 @@ async def analyze_portfolio(user_id: str = Header(alias="User-ID"), db: Session
                     )
                 )
         except Exception as e:
-            # If we can't get current price, use the stored price
+            # If we can't get current price, use the stored price and the
+            # values the database derived from it
             current_price = trade.current_price
             total_value = trade.quantity * current_price
-            unrealized_pnl = (
-                current_price - trade.avg_buy_price) * trade.quantity
-            percent_change = (
-                (current_price - trade.avg_buy_price) / trade.avg_buy_price) * 100
+            unrealized_pnl = trade.unrealized_pnl
+            percent_change = trade.percent_change
 
             total_portfolio_value += total_value
             total_profit_loss += unrealized_pnl
@@ -420,15 +664,15 @@ async def analyze_portfolio(user_id: str = Header(alias="User-ID"), db: Session
                 )
             )
     # Calculate total percent change based on total investment and current value
-    total_investment = sum(
-        trade.quantity * trade.avg_buy_price for trade in trades)
     if total_investment > 0:
         total_percent_change = (total_profit_loss / total_investment) * 100
     else:
-        total_percent_change = 0.0
+        total_percent_change = Decimal(0)
 
-    # Commit the updates to the database
+    # Write all refreshed trade values in one bulk UPDATE by primary key
     try:
+        if updates:
+            db.execute(update(Trade), updates)
         db.commit()
     except Exception as e:
         db.rollback()
@@ -0,0 +1,22 @@
+-- Store quantities and prices as exact decimals and let Postgres derive
+-- unrealized_pnl and percent_change from them.
+BEGIN;
+
+ALTER TABLE trades
+    DROP COLUMN unrealized_pnl,
+    DROP COLUMN percent_change,
+    ALTER COLUMN quantity TYPE NUMERIC(38, 18),
+    ALTER COLUMN avg_buy_price TYPE NUMERIC(38, 18),
+    ALTER COLUMN current_price TYPE NUMERIC(38, 18);
+
+ALTER TABLE trades
+    ADD COLUMN unrealized_pnl NUMERIC
+        GENERATED ALWAYS AS (quantity * (current_price - avg_buy_price)) STORED,
+    ADD COLUMN percent_change NUMERIC
+        GENERATED ALWAYS AS (
+            CASE WHEN avg_buy_price > 0
+                THEN (current_price - avg_buy_price) / avg_buy_price * 100
+                ELSE 0 END
+        ) STORED;
+
+COMMIT;
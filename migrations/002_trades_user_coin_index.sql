@@ -0,0 +1,9 @@
+-- Replace the single-column user_id index with a composite index that
+-- includes every column the portfolio read loads.
+-- CONCURRENTLY avoids blocking writes to trades but cannot run inside a
+-- transaction block, so apply this file with psql's default autocommit.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_trades_user_coin
+ON trades (user_id, coin_symbol)
+INCLUDE (id, quantity, avg_buy_price, current_price, unrealized_pnl, percent_change);
+
+DROP INDEX CONCURRENTLY IF EXISTS ix_trades_user_id;
@@ -0,0 +1,10 @@
+-- Let Postgres fill trades.created_at now that the application no longer
+-- sends it. Existing values were written with datetime.utcnow(), so they
+-- are interpreted as UTC.
+BEGIN;
+
+ALTER TABLE trades
+    ALTER COLUMN created_at TYPE TIMESTAMPTZ USING created_at AT TIME ZONE 'UTC',
+    ALTER COLUMN created_at SET DEFAULT now();
+
+COMMIT;